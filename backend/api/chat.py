@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field, HttpUrl
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 import json
 import logging
+import msgpack
 from datetime import datetime
 
 from backend.core.database import get_db
@@ -71,6 +72,15 @@ class ConnectionManager:
             except Exception as e:
                 logger.error(f"发送消息失败: {e}")
                 self.disconnect(session_id)
+    
+    async def send_packed_chunk(self, session_id: str, content: str):
+        """以MsgPack二进制帧发送流式消息块，只保留类型标记(t=1)和内容，省去JSON信封"""
+        if session_id in self.active_connections:
+            try:
+                await self.active_connections[session_id].send_bytes(msgpack.packb({"t": 1, "c": content}))
+            except Exception as e:
+                logger.error(f"发送消息块失败: {e}")
+                self.disconnect(session_id)
 
 
 manager = ConnectionManager()
@@ -198,9 +208,10 @@ async def websocket_endpoint(
     websocket: WebSocket,
     session_id: str,
     token: Optional[str] = None,
+    chunk_format: Literal["json", "msgpack"] = "json",
     db: Session = Depends(get_db)
 ):
-    """WebSocket对话端点"""
+    """WebSocket对话端点，chunk_format=msgpack时流式消息块以MsgPack二进制帧发送"""
     
     # 从查询参数获取token
     if not token:
@@ -290,7 +301,11 @@ async def websocket_endpoint(
                         }
                     
                     # 转换响应格式以适配WebSocket消息格式
-                    if stream_response.get("type") == "message_chunk":
+                    if stream_response.get("type") == "message_chunk" and chunk_format == "msgpack":
+                        # 客户端协商了二进制格式，消息块直接发送，其余消息仍为JSON
+                        await manager.send_packed_chunk(session_id, stream_response["data"]["content"])
+                        continue
+                    elif stream_response.get("type") == "message_chunk":
                         # 流式消息块
                         websocket_response = {
                             "type": "message_chunk",
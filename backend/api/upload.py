@@ -1,4 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
@@ -18,6 +21,12 @@ from backend.services.ocr import create_ocr_service
 router = APIRouter(prefix="/upload", tags=["文件上传"])
 logger = logging.getLogger(__name__)
 
+# 文件上传接口在路由内的路径
+UPLOAD_FILE_PATH = "/file"
+
+# multipart请求中除文件内容外的表单字段和分隔符所允许的额外大小
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
 
 class UploadResponse(BaseModel):
     """上传响应模型"""
@@ -48,6 +57,38 @@ def validate_file(file: UploadFile) -> bool:
     return True
 
 
+def file_too_large_detail() -> str:
+    """文件过大时的错误提示"""
+    return f"文件过大。最大允许大小为 {settings.max_upload_size // (1024*1024)} MB。"
+
+
+def exceeds_upload_limit(content_length: Optional[str]) -> bool:
+    """根据请求声明的Content-Length判断上传是否必然超过大小限制"""
+    if not content_length or not content_length.isdigit():
+        return False
+    return int(content_length) > settings.max_upload_size + UPLOAD_FORM_OVERHEAD
+
+
+class UploadSizeLimitMiddleware:
+    """根据Content-Length提前拒绝过大的上传，只检查上传接口，无需读取请求体"""
+    
+    def __init__(self, app: ASGIApp, api_prefix: str = ""):
+        self.app = app
+        self.upload_path = f"{api_prefix}{router.prefix}{UPLOAD_FILE_PATH}"
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"] == self.upload_path
+            and exceeds_upload_limit(Headers(scope=scope).get("content-length"))
+        ):
+            response = JSONResponse(status_code=400, content={"detail": file_too_large_detail()})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
 def save_uploaded_file(file: UploadFile, file_id: str) -> str:
     """保存上传的文件"""
     # 确保上传目录存在
@@ -110,7 +151,7 @@ def process_file_if_needed(file_path: str, max_size: int = 2048) -> str:
         return file_path
 
 
-@router.post("/file", response_model=UploadResponse)
+@router.post(UPLOAD_FILE_PATH, response_model=UploadResponse)
 async def upload_file(
     file: UploadFile = File(...),
     session_id: Optional[str] = Form(None),
@@ -135,7 +176,7 @@ async def upload_file(
     if file_size > settings.max_upload_size:
         raise HTTPException(
             status_code=400,
-            detail=f"文件过大。最大允许大小为 {settings.max_upload_size // (1024*1024)} MB。"
+            detail=file_too_large_detail()
         )
     
     try:
@@ -46,6 +46,9 @@ async def lifespan(app: FastAPI):
     logger.info("应用关闭中...")
 
 
+# API路由统一前缀
+API_PREFIX = "/api"
+
 # 创建FastAPI应用
 app = FastAPI(
     title="BPM Agent",
@@ -54,6 +57,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 上传大小检查需在CORS之内，确保拒绝响应同样带有CORS头
+app.add_middleware(upload.UploadSizeLimitMiddleware, api_prefix=API_PREFIX)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -64,9 +70,9 @@ app.add_middleware(
 )
 
 # 注册路由
-app.include_router(auth.router, prefix="/api")
-app.include_router(chat.router, prefix="/api")
-app.include_router(upload.router, prefix="/api")
+app.include_router(auth.router, prefix=API_PREFIX)
+app.include_router(chat.router, prefix=API_PREFIX)
+app.include_router(upload.router, prefix=API_PREFIX)
 
 # 静态文件服务（用于前端）
 if os.path.exists("frontend/dist"):
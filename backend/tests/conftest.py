@@ -4,6 +4,7 @@ pytest配置文件
 """
 
 import os
+import shutil
 import sys
 from pathlib import Path
 
@@ -24,6 +25,7 @@ from typing import Generator, AsyncGenerator
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from httpx import AsyncClient
 import httpx
 
@@ -33,19 +35,51 @@ from backend.core.config import settings
 # 导入所有模型类以确保表能被创建
 from backend.models.user import User, UserSession, TaskHistory
 
-# 测试数据库URL - 使用文件数据库避免内存数据库的连接问题
-TEST_DATABASE_URL = "sqlite:///./test_bmp_agent_temp.db"
+# 认证fixture使用的用户，与test_user_data区分开，避免与注册相关的测试冲突
+AUTH_USER_DATA = {
+    "username": "authfixtureuser",
+    "email": "auth-fixture@example.com",
+    "password": "authfixture123",
+    "full_name": "Auth Fixture User"
+}
+
+# pytest-xdist并行运行时的worker标识
+TEST_WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "main")
+
+# 测试数据库URL - 使用内存数据库，避免每次提交的磁盘读写
+# 每个xdist worker是独立进程，天然拥有各自的内存数据库
+TEST_DATABASE_URL = "sqlite://"
 
 # 创建测试数据库引擎
 test_engine = create_engine(
     TEST_DATABASE_URL, 
     connect_args={"check_same_thread": False},
-    poolclass=None  # 文件数据库不需要连接池
+    poolclass=StaticPool  # 所有连接共享同一个内存数据库，否则每个连接看到的都是空库
 )
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
 
 
+def pytest_addoption(parser):
+    """注册命令行选项"""
+    parser.addoption("--runslow", action="store_true", default=False, help="运行标记为slow的耗时测试")
+
+
+def pytest_configure(config):
+    """注册自定义标记"""
+    config.addinivalue_line("markers", "slow: 耗时较长的测试，默认跳过，使用 --runslow 运行")
+
+
+def pytest_collection_modifyitems(config, items):
+    """未指定 --runslow 时跳过slow测试"""
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="需要 --runslow 选项才会运行")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
 def override_get_db():
     """覆盖数据库依赖，使用测试数据库"""
     try:
@@ -63,17 +97,38 @@ def event_loop():
     loop.close()
 
 
-@pytest.fixture(scope="function")
-def db_session():
-    """创建测试数据库会话"""
-    # 确保测试数据库文件不存在
-    test_db_file = "test_bmp_agent_temp.db"
-    if os.path.exists(test_db_file):
-        try:
-            os.remove(test_db_file)
-        except OSError:
-            pass
-    
+@pytest.fixture(autouse=True, scope="session")
+def fast_password_hashing():
+    """测试中使用最低bcrypt轮数，避免密码哈希拖慢注册/登录"""
+    from passlib.context import CryptContext
+    import backend.api.auth as auth_module
+
+    original_context = auth_module.pwd_context
+    auth_module.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+    yield
+    auth_module.pwd_context = original_context
+
+
+@pytest.fixture(autouse=True, scope="session")
+def upload_dir(tmp_path_factory):
+    """上传文件写入临时目录，pytest-xdist下每个worker的目录相互独立"""
+    upload_path = tmp_path_factory.mktemp(f"uploads_{TEST_WORKER_ID}")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "upload_dir", str(upload_path))
+        yield upload_path
+
+
+@pytest.fixture(autouse=True)
+def upload_cleanup(upload_dir):
+    """每个测试结束后删除上传的文件，避免临时目录随测试数量增长"""
+    yield
+    shutil.rmtree(upload_dir, ignore_errors=True)
+    upload_dir.mkdir(exist_ok=True)
+
+
+@pytest.fixture(scope="session")
+def test_database():
+    """创建测试数据库，整个测试会话只建表一次"""
     # 创建所有表
     Base.metadata.create_all(bind=test_engine)
     
@@ -88,26 +143,36 @@ def db_session():
     
     # 关闭所有连接
     test_engine.dispose()
-    
-    # 删除测试数据库文件
-    if os.path.exists(test_db_file):
-        try:
-            os.remove(test_db_file)
-        except OSError:
-            pass
 
 
-@pytest.fixture
-def client(db_session) -> TestClient:
-    """创建测试客户端"""
-    # 确保在创建客户端时数据库依赖已经被覆盖
+@pytest.fixture(autouse=True)
+def db_session(request):
+    """每个测试结束后清空数据表，保证测试之间相互隔离"""
+    yield
+    
+    # 只有用到测试数据库的测试才需要清理
+    if "test_database" not in request.fixturenames:
+        return
+    
+    with test_engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            statement = table.delete()
+            if table is User.__table__:
+                # 保留会话级的认证用户，auth_headers的token在整个测试会话内复用
+                statement = statement.where(User.username != AUTH_USER_DATA["username"])
+            connection.execute(statement)
+
+
+@pytest.fixture(scope="module")
+def client(test_database) -> TestClient:
+    """创建测试客户端，同一模块内的测试复用"""
     with TestClient(app) as test_client:
         yield test_client
 
 
-@pytest_asyncio.fixture
-async def async_client(db_session) -> AsyncGenerator[AsyncClient, None]:
-    """创建异步测试客户端"""
+@pytest_asyncio.fixture(scope="module")
+async def async_client(test_database) -> AsyncGenerator[AsyncClient, None]:
+    """创建异步测试客户端，同一模块内的测试复用"""
     transport = httpx.ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
@@ -133,34 +198,28 @@ def test_login_data():
     }
 
 
-@pytest.fixture
-def auth_headers(client: TestClient, test_user_data: dict):
-    """获取认证头部"""
-    # 先注册用户
-    client.post("/api/auth/register", json=test_user_data)
-    
-    # 登录获取token
-    login_response = client.post("/api/auth/login", json={
-        "username": test_user_data["username"],
-        "password": test_user_data["password"]
-    })
+@pytest.fixture(scope="session")
+def auth_headers(test_database):
+    """获取认证头部，整个测试会话只注册和登录一次"""
+    with TestClient(app) as session_client:
+        # 先注册用户
+        session_client.post("/api/auth/register", json=AUTH_USER_DATA)
+        
+        # 登录获取token
+        login_response = session_client.post("/api/auth/login", json={
+            "username": AUTH_USER_DATA["username"],
+            "password": AUTH_USER_DATA["password"]
+        })
     
     token = login_response.json()["access_token"]
     return {"Authorization": f"Bearer {token}"}
 
 
-def cleanup_test_files():
-    """清理测试文件"""
-    test_db_file = "test_bmp_agent_temp.db"
-    if os.path.exists(test_db_file):
-        try:
-            os.remove(test_db_file)
-        except OSError:
-            pass  # 忽略删除失败的情况
-
-
-@pytest.fixture(autouse=True)
-def cleanup():
-    """自动清理fixture"""
-    yield
-    cleanup_test_files()
\ No newline at end of file
+@pytest.fixture
+def created_session(client: TestClient, auth_headers: dict) -> str:
+    """预先创建一个会话，返回session_id供依赖会话的测试复用"""
+    response = client.post("/api/chat/sessions", json={
+        "target_url": "https://example.com",
+        "session_name": "测试会话"
+    }, headers=auth_headers)
+    return response.json()["session_id"]
@@ -34,7 +34,8 @@ def check_dependencies():
         ("httpx", "httpx"),
         ("fastapi", "fastapi"),
         ("sqlalchemy", "sqlalchemy"),
-        ("pillow", "PIL")
+        ("pillow", "PIL"),
+        ("pytest-xdist", "xdist")
     ]
     
     missing_packages = []
@@ -54,7 +55,7 @@ def check_dependencies():
     return True
 
 
-def run_pytest(test_files=None, verbose=False, coverage=False):
+def run_pytest(test_files=None, verbose=False, coverage=False, workers=None, runslow=False):
     """运行pytest测试"""
     cmd = ["python", "-m", "pytest"]
     
@@ -69,6 +70,13 @@ def run_pytest(test_files=None, verbose=False, coverage=False):
     if coverage:
         cmd.extend(["--cov=backend", "--cov-report=html", "--cov-report=term"])
     
+    if workers:
+        # 使用pytest-xdist并行运行，每个worker使用独立的测试数据库
+        cmd.extend(["-n", workers])
+    
+    if runslow:
+        cmd.append("--runslow")
+    
     # 添加其他有用的选项
     cmd.extend([
         "--tb=short",  # 简短的错误回溯
@@ -132,7 +140,8 @@ def generate_test_report():
         "--cov=backend",
         "--cov-report=html:htmlcov",
         "--cov-report=term-missing",
-        "--junit-xml=test_results.xml"
+        "--junit-xml=test_results.xml",
+        "--runslow"
     ]
     
     try:
@@ -153,6 +162,8 @@ def main():
     parser.add_argument("-c", "--coverage", action="store_true", help="生成覆盖率报告")
     parser.add_argument("-r", "--report", action="store_true", help="生成详细测试报告")
     parser.add_argument("-i", "--interactive", action="store_true", help="交互式选择测试")
+    parser.add_argument("-n", "--workers", help="并行运行的worker数量 (如 auto 或 4)")
+    parser.add_argument("--runslow", action="store_true", help="同时运行标记为slow的耗时测试")
     parser.add_argument("--auth", action="store_true", help="只运行认证测试")
     parser.add_argument("--chat", action="store_true", help="只运行聊天测试")
     parser.add_argument("--upload", action="store_true", help="只运行上传测试")
@@ -183,14 +194,14 @@ def main():
         elif args.interactive:
             success = run_specific_tests()
         elif args.auth:
-            success = run_pytest(["tests/test_auth.py"], args.verbose, args.coverage)
+            success = run_pytest(["tests/test_auth.py"], args.verbose, args.coverage, args.workers, args.runslow)
         elif args.chat:
-            success = run_pytest(["tests/test_chat.py"], args.verbose, args.coverage)
+            success = run_pytest(["tests/test_chat.py"], args.verbose, args.coverage, args.workers, args.runslow)
         elif args.upload:
-            success = run_pytest(["tests/test_upload.py"], args.verbose, args.coverage)
+            success = run_pytest(["tests/test_upload.py"], args.verbose, args.coverage, args.workers, args.runslow)
         else:
             # 默认运行所有测试
-            success = run_pytest(verbose=args.verbose, coverage=args.coverage)
+            success = run_pytest(verbose=args.verbose, coverage=args.coverage, workers=args.workers, runslow=args.runslow)
         
         print("\n" + "="*50)
         if success:
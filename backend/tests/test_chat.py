@@ -5,10 +5,34 @@
 """
 
 import pytest
+from typing import List
+from fastapi import WebSocketDisconnect
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
+from pydantic import TypeAdapter
+from unittest.mock import AsyncMock, Mock
 import json
-import uuid
+import msgpack
+
+from backend.api.chat import SessionResponse
+
+# 测试用的不存在会话ID，值本身不参与断言，无需每次随机生成
+FAKE_SESSION_ID = "00000000-0000-0000-0000-000000000000"
+
+
+@pytest.fixture
+def stub_bpm_agent(monkeypatch):
+    """用固定的流式响应替换BPM代理，避免调用大模型"""
+    async def process_user_message_stream(user_message, message_type):
+        for chunk in ("你好", "，世界"):
+            yield {"type": "message_chunk", "data": {"content": chunk, "message_type": "text"}}
+        yield {"type": "message_complete", "data": {"full_message": "你好，世界", "intent": "chat", "actions": []}}
+    
+    bpm_agent = Mock()
+    bpm_agent.process_user_message_stream = process_user_message_stream
+    bpm_agent.cleanup = AsyncMock()
+    monkeypatch.setattr("backend.api.chat.BPMAgentService", lambda *args, **kwargs: bpm_agent)
+    return bpm_agent
 
 
 class TestChatAPI:
@@ -24,12 +48,11 @@ class TestChatAPI:
         response = client.post("/api/chat/sessions", json=session_data, headers=auth_headers)
         
         assert response.status_code == 200
-        data = response.json()
-        assert "session_id" in data
-        assert data["session_name"] == session_data["session_name"]
-        assert data["target_url"] == "https://example.com/"  # HttpUrl会自动添加尾部斜杠
-        assert data["status"] == "active"
-        assert "created_at" in data
+        # 直接用响应模型校验，字段缺失或类型错误都会抛出ValidationError
+        session = SessionResponse.model_validate_json(response.content)
+        assert session.session_name == session_data["session_name"]
+        assert session.target_url == "https://example.com/"  # HttpUrl会自动添加尾部斜杠
+        assert session.status == "active"
     
     def test_create_session_without_auth(self, client: TestClient):
         """测试未认证创建会话"""
@@ -73,16 +96,9 @@ class TestChatAPI:
         response = client.get("/api/chat/sessions", headers=auth_headers)
         
         assert response.status_code == 200
-        data = response.json()
-        assert isinstance(data, list)
-        assert len(data) >= 2
-        
-        # 检查会话数据结构
-        for session in data:
-            assert "session_id" in session
-            assert "session_name" in session
-            assert "status" in session
-            assert "created_at" in session
+        # 逐个按响应模型校验会话数据结构
+        sessions = TypeAdapter(List[SessionResponse]).validate_json(response.content)
+        assert len(sessions) >= 2
     
     def test_get_user_sessions_without_auth(self, client: TestClient):
         """测试未认证获取会话列表"""
@@ -90,56 +106,32 @@ class TestChatAPI:
         
         assert response.status_code == 403
     
-    def test_get_session_by_id(self, client: TestClient, auth_headers: dict):
+    def test_get_session_by_id(self, client: TestClient, auth_headers: dict, created_session: str):
         """测试根据ID获取会话"""
-        # 先创建一个会话
-        session_data = {
-            "target_url": "https://example.com",
-            "session_name": "测试会话"
-        }
-        
-        create_response = client.post("/api/chat/sessions", json=session_data, headers=auth_headers)
-        session_id = create_response.json()["session_id"]
-        
-        # 获取会话详情
-        response = client.get(f"/api/chat/sessions/{session_id}", headers=auth_headers)
+        response = client.get(f"/api/chat/sessions/{created_session}", headers=auth_headers)
         
         assert response.status_code == 200
-        data = response.json()
-        assert data["session_id"] == session_id
-        assert data["session_name"] == session_data["session_name"]
-        assert data["status"] == "active"
+        session = SessionResponse.model_validate_json(response.content)
+        assert session.session_id == created_session
+        assert session.session_name == "测试会话"
+        assert session.status == "active"
     
     def test_get_session_not_found(self, client: TestClient, auth_headers: dict):
         """测试获取不存在的会话"""
-        fake_session_id = str(uuid.uuid4())
-        
-        response = client.get(f"/api/chat/sessions/{fake_session_id}", headers=auth_headers)
+        response = client.get(f"/api/chat/sessions/{FAKE_SESSION_ID}", headers=auth_headers)
         
         assert response.status_code == 404
         assert "会话不存在" in response.json()["detail"]
     
     def test_get_session_without_auth(self, client: TestClient):
         """测试未认证获取会话详情"""
-        fake_session_id = str(uuid.uuid4())
-        
-        response = client.get(f"/api/chat/sessions/{fake_session_id}")
+        response = client.get(f"/api/chat/sessions/{FAKE_SESSION_ID}")
         
         assert response.status_code == 403
     
-    def test_get_session_history(self, client: TestClient, auth_headers: dict):
+    def test_get_session_history(self, client: TestClient, auth_headers: dict, created_session: str):
         """测试获取会话历史记录"""
-        # 先创建一个会话
-        session_data = {
-            "target_url": "https://example.com",
-            "session_name": "测试会话"
-        }
-        
-        create_response = client.post("/api/chat/sessions", json=session_data, headers=auth_headers)
-        session_id = create_response.json()["session_id"]
-        
-        # 获取会话历史记录
-        response = client.get(f"/api/chat/sessions/{session_id}/history", headers=auth_headers)
+        response = client.get(f"/api/chat/sessions/{created_session}/history", headers=auth_headers)
         
         assert response.status_code == 200
         data = response.json()
@@ -149,18 +141,14 @@ class TestChatAPI:
     
     def test_get_session_history_not_found(self, client: TestClient, auth_headers: dict):
         """测试获取不存在会话的历史记录"""
-        fake_session_id = str(uuid.uuid4())
-        
-        response = client.get(f"/api/chat/sessions/{fake_session_id}/history", headers=auth_headers)
+        response = client.get(f"/api/chat/sessions/{FAKE_SESSION_ID}/history", headers=auth_headers)
         
         assert response.status_code == 404
         assert "会话不存在" in response.json()["detail"]
     
     def test_get_session_history_without_auth(self, client: TestClient):
         """测试未认证获取会话历史记录"""
-        fake_session_id = str(uuid.uuid4())
-        
-        response = client.get(f"/api/chat/sessions/{fake_session_id}/history")
+        response = client.get(f"/api/chat/sessions/{FAKE_SESSION_ID}/history")
         
         assert response.status_code == 403
 
@@ -169,52 +157,31 @@ class TestChatAPI:
 class TestChatAPIAsync:
     """聊天API异步测试类"""
     
-    async def test_create_session_async(self, async_client: AsyncClient, test_user_data: dict):
+    async def test_create_session_async(self, async_client: AsyncClient, auth_headers: dict):
         """测试异步创建会话"""
-        # 先注册和登录用户
-        await async_client.post("/api/auth/register", json=test_user_data)
-        login_response = await async_client.post("/api/auth/login", json={
-            "username": test_user_data["username"],
-            "password": test_user_data["password"]
-        })
-        
-        token = login_response.json()["access_token"]
-        headers = {"Authorization": f"Bearer {token}"}
-        
         # 创建会话
         session_data = {
             "target_url": "https://example.com",
             "session_name": "异步测试会话"
         }
         
-        response = await async_client.post("/api/chat/sessions", json=session_data, headers=headers)
+        response = await async_client.post("/api/chat/sessions", json=session_data, headers=auth_headers)
         
         assert response.status_code == 200
-        data = response.json()
-        assert "session_id" in data
-        assert data["session_name"] == session_data["session_name"]
+        session = SessionResponse.model_validate_json(response.content)
+        assert session.session_name == session_data["session_name"]
     
-    async def test_get_sessions_async(self, async_client: AsyncClient, test_user_data: dict):
+    async def test_get_sessions_async(self, async_client: AsyncClient, auth_headers: dict):
         """测试异步获取会话列表"""
-        # 先注册和登录用户
-        await async_client.post("/api/auth/register", json=test_user_data)
-        login_response = await async_client.post("/api/auth/login", json={
-            "username": test_user_data["username"],
-            "password": test_user_data["password"]
-        })
-        
-        token = login_response.json()["access_token"]
-        headers = {"Authorization": f"Bearer {token}"}
-        
         # 创建会话
         session_data = {
             "target_url": "https://example.com",
             "session_name": "异步测试会话"
         }
-        await async_client.post("/api/chat/sessions", json=session_data, headers=headers)
+        await async_client.post("/api/chat/sessions", json=session_data, headers=auth_headers)
         
         # 获取会话列表
-        response = await async_client.get("/api/chat/sessions", headers=headers)
+        response = await async_client.get("/api/chat/sessions", headers=auth_headers)
         
         assert response.status_code == 200
         data = response.json()
@@ -227,33 +194,27 @@ class TestWebSocketConnection:
     
     def test_websocket_connection_without_token(self, client: TestClient):
         """测试无token的WebSocket连接"""
-        session_id = str(uuid.uuid4())
-        
         with pytest.raises(Exception):
             # WebSocket连接应该失败
-            with client.websocket_connect(f"/api/chat/ws/{session_id}"):
+            with client.websocket_connect(f"/api/chat/ws/{FAKE_SESSION_ID}"):
                 pass
     
     def test_websocket_connection_invalid_token(self, client: TestClient):
         """测试无效token的WebSocket连接"""
-        session_id = str(uuid.uuid4())
-        
         with pytest.raises(Exception):
             # WebSocket连接应该失败
-            with client.websocket_connect(f"/api/chat/ws/{session_id}?token=invalid_token"):
+            with client.websocket_connect(f"/api/chat/ws/{FAKE_SESSION_ID}?token=invalid_token"):
                 pass
     
     def test_websocket_connection_nonexistent_session(self, client: TestClient, auth_headers: dict):
         """测试连接不存在的会话"""
         # 从auth_headers中提取token
         token = auth_headers["Authorization"].replace("Bearer ", "")
-        fake_session_id = str(uuid.uuid4())
-        
         # WebSocket连接应该被服务器关闭，因为会话不存在
         # 我们需要检查连接是否会被正确关闭
         connection_closed = False
         try:
-            with client.websocket_connect(f"/api/chat/ws/{fake_session_id}?token={token}") as websocket:
+            with client.websocket_connect(f"/api/chat/ws/{FAKE_SESSION_ID}?token={token}") as websocket:
                 # 尝试接收消息，如果会话不存在，连接应该被关闭
                 try:
                     # 等待一小段时间看是否有消息或连接关闭
@@ -268,4 +229,32 @@ class TestWebSocketConnection:
             connection_closed = True
         
         # 验证连接确实被关闭了
-        assert connection_closed, "WebSocket连接应该因为会话不存在而被关闭"
\ No newline at end of file
+        assert connection_closed, "WebSocket连接应该因为会话不存在而被关闭"
+    
+    def test_websocket_msgpack_chunks(self, client: TestClient, auth_headers: dict, created_session: str, stub_bpm_agent):
+        """测试chunk_format=msgpack时消息块为二进制帧，完成消息仍为JSON文本帧"""
+        token = auth_headers["Authorization"].replace("Bearer ", "")
+        
+        with client.websocket_connect(f"/api/chat/ws/{created_session}?token={token}&chunk_format=msgpack") as websocket:
+            # 欢迎消息
+            assert websocket.receive_json()["type"] == "message"
+            
+            websocket.send_text(json.dumps({"message": "你好", "type": "text"}))
+            assert websocket.receive_json()["type"] == "status"
+            
+            # receive_bytes只接受二进制帧
+            chunks = [msgpack.unpackb(websocket.receive_bytes(), raw=False) for _ in range(2)]
+            assert chunks == [{"t": 1, "c": "你好"}, {"t": 1, "c": "，世界"}]
+            
+            # receive_json只接受文本帧
+            complete = websocket.receive_json()
+            assert complete["type"] == "message_complete"
+            assert complete["content"] == "你好，世界"
+    
+    def test_websocket_invalid_chunk_format(self, client: TestClient, auth_headers: dict, created_session: str):
+        """测试不支持的chunk_format被拒绝，而不是静默回退到JSON"""
+        token = auth_headers["Authorization"].replace("Bearer ", "")
+        
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect(f"/api/chat/ws/{created_session}?token={token}&chunk_format=msgpak"):
+                pass
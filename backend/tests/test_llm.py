@@ -6,6 +6,7 @@ LLM接口测试脚本
 
 import pytest
 import asyncio
+import logging
 import sys
 import os
 from pathlib import Path
@@ -17,25 +18,21 @@ sys.path.insert(0, str(project_root))
 from backend.services.ai import create_ai_service
 from backend.core.config import settings
 
+log = logging.getLogger(__name__)
+
 
 @pytest.mark.asyncio
 async def test_ai_service_init():
     """测试AI服务初始化"""
-    print("🔧 测试AI服务初始化...")
     ai_service = create_ai_service()
     assert ai_service is not None
-    print(f"✅ AI服务初始化成功")
-    print(f"   - API Key: {settings.qwen_api_key[:10]}...")
-    print(f"   - Base URL: {settings.qwen_base_url}")
-    print(f"   - Model: {settings.qwen_model}")
+    log.debug("AI服务初始化成功: base_url=%s, model=%s", settings.qwen_base_url, settings.qwen_model)
     return ai_service
 
 
 @pytest.mark.asyncio
 async def test_intent_recognition():
     """测试意图识别功能"""
-    print("\n🎯 测试意图识别功能...")
-    
     ai_service = create_ai_service()
     assert ai_service is not None
     
@@ -48,17 +45,14 @@ async def test_intent_recognition():
     ]
     
     for i, test_input in enumerate(test_cases, 1):
-        print(f"\n测试用例 {i}: '{test_input}'")
         result = await ai_service.recognize_intent(test_input)
-        print(f"   识别结果: {result}")
+        log.debug("测试用例 %d: %r -> %s", i, test_input, result)
         assert result is not None
 
 
 @pytest.mark.asyncio
 async def test_conversation():
     """测试对话功能"""
-    print("\n💬 测试对话功能...")
-    
     ai_service = create_ai_service()
     assert ai_service is not None
     
@@ -69,9 +63,8 @@ async def test_conversation():
     ]
     
     for i, message in enumerate(test_messages, 1):
-        print(f"\n对话 {i}: '{message}'")
         response = await ai_service.generate_response(message)
-        print(f"   回复: {response}")
+        log.debug("对话 %d: %r -> %s", i, message, response)
         assert response is not None
         assert len(response) > 0
 
@@ -79,8 +72,6 @@ async def test_conversation():
 @pytest.mark.asyncio
 async def test_web_analysis():
     """测试网页分析功能"""
-    print("\n🌐 测试网页分析功能...")
-    
     ai_service = create_ai_service()
     assert ai_service is not None
     
@@ -107,12 +98,11 @@ async def test_web_analysis():
     </html>
     """
     
-    print("分析模拟报销表单页面...")
     analysis = await ai_service.analyze_webpage(test_image_bytes, mock_html)
-    print(f"   页面类型: {analysis.page_type}")
-    print(f"   表单字段数量: {len(analysis.form_fields)}")
-    print(f"   按钮数量: {len(analysis.buttons)}")
-    print(f"   置信度: {analysis.confidence:.2f}")
+    log.debug(
+        "页面类型: %s, 表单字段数量: %d, 按钮数量: %d, 置信度: %.2f",
+        analysis.page_type, len(analysis.form_fields), len(analysis.buttons), analysis.confidence
+    )
     assert analysis is not None
 
 
@@ -120,7 +110,6 @@ async def test_web_analysis():
 async def main():
     """主测试函数"""
     print("🚀 开始测试LLM接口...")
-    print("=" * 50)
     
     # 检查配置
     if not settings.qwen_api_key or settings.qwen_api_key == "your-qwen-api-key":
@@ -132,7 +121,6 @@ async def main():
     if not ai_service:
         return
     
-    print("\n" + "=" * 50)
     print("🎉 LLM接口测试完成!")
 
 
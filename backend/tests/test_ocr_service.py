@@ -12,6 +12,12 @@ from backend.services.ocr import create_ocr_service
 from backend.services.ocr.aliyun_ocr import AliyunOCRService
 from backend.services.ocr.base import OCRResult
 
+# 需要真实阿里云OCR密钥的测试在收集阶段即跳过
+requires_aliyun_credentials = pytest.mark.skipif(
+    not all(os.getenv(key) for key in ("ALIYUN_ACCESS_KEY_ID", "ALIYUN_ACCESS_KEY_SECRET")),
+    reason="未配置阿里云OCR密钥: ALIYUN_ACCESS_KEY_ID / ALIYUN_ACCESS_KEY_SECRET"
+)
+
 
 class TestOCRService:
     """OCR服务单元测试类"""
@@ -20,20 +26,14 @@ class TestOCRService:
         """测试前准备"""
         self.test_image_path = Path(__file__).parent / "test_data" / "invoice1.png"
 
+    @requires_aliyun_credentials
     @pytest.mark.asyncio
     async def test_aliyun_ocr_success(self):
         """测试阿里云OCR服务成功识别"""
-        # 检查配置
-        access_key_id = os.getenv('ALIYUN_ACCESS_KEY_ID')
-        access_key_secret = os.getenv('ALIYUN_ACCESS_KEY_SECRET')
-        
-        if not access_key_id or not access_key_secret:
-            pytest.skip("跳过OCR测试: 未配置阿里云OCR密钥")
-        
         # 创建OCR服务 - 使用正确的配置格式
         config = {
-            'access_key_id': access_key_id,
-            'access_key_secret': access_key_secret
+            'access_key_id': os.getenv('ALIYUN_ACCESS_KEY_ID'),
+            'access_key_secret': os.getenv('ALIYUN_ACCESS_KEY_SECRET')
         }
         ocr_service = AliyunOCRService(config)
         
@@ -51,20 +51,14 @@ class TestOCRService:
         else:
             assert result.error_message is not None
 
+    @requires_aliyun_credentials
     @pytest.mark.asyncio
     async def test_aliyun_ocr_invalid_image(self):
         """测试阿里云OCR服务处理无效图片"""
-        # 检查配置
-        access_key_id = os.getenv('ALIYUN_ACCESS_KEY_ID')
-        access_key_secret = os.getenv('ALIYUN_ACCESS_KEY_SECRET')
-        
-        if not access_key_id or not access_key_secret:
-            pytest.skip("跳过阿里云OCR测试: 未配置ALIYUN_ACCESS_KEY_ID或ALIYUN_ACCESS_KEY_SECRET")
-        
         # 创建阿里云OCR服务
         config = {
-            'access_key_id': access_key_id,
-            'access_key_secret': access_key_secret
+            'access_key_id': os.getenv('ALIYUN_ACCESS_KEY_ID'),
+            'access_key_secret': os.getenv('ALIYUN_ACCESS_KEY_SECRET')
         }
         ocr_service = AliyunOCRService(config)
         
@@ -79,21 +73,23 @@ class TestOCRService:
         assert result.success is False
         assert result.error_message is not None
 
-    def test_create_ocr_service_success(self):
+    @patch.object(AliyunOCRService, '__init__', return_value=None)
+    @patch('backend.services.ocr.settings')
+    def test_create_ocr_service_success(self, mock_settings, mock_init):
         """测试OCR服务工厂方法成功创建"""
-        # 检查配置
-        access_key_id = os.getenv('ALIYUN_ACCESS_KEY_ID')
-        access_key_secret = os.getenv('ALIYUN_ACCESS_KEY_SECRET')
-        
-        if not access_key_id or not access_key_secret:
-            pytest.skip("跳过工厂方法测试: 未配置阿里云OCR密钥")
+        # 只验证工厂方法按配置创建服务，不初始化真实的阿里云服务
+        mock_settings.aliyun_access_key_id = "test-access-key-id"
+        mock_settings.aliyun_access_key_secret = "test-access-key-secret"
         
         # 使用工厂方法创建服务
         ocr_service = create_ocr_service()
         
-        # 验证服务类型
+        # 验证服务类型和传入的配置
         assert isinstance(ocr_service, AliyunOCRService)
-        assert ocr_service is not None
+        mock_init.assert_called_once_with({
+            'access_key_id': "test-access-key-id",
+            'access_key_secret': "test-access-key-secret"
+        })
 
     @patch('backend.services.ocr.settings')
     def test_create_ocr_service_missing_config(self, mock_settings):
@@ -4,22 +4,67 @@
 """
 
 import pytest
+from fastapi import UploadFile
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
+import functools
 import io
+import math
 import os
 import tempfile
+from pathlib import Path
 from PIL import Image
+from unittest.mock import AsyncMock, Mock
 import uuid
 
+from backend.core.config import settings
+from backend.services.ocr.base import OCRResult
 
-def create_test_image(format="PNG", size=(100, 100), color="RGB"):
-    """创建测试图片"""
-    img = Image.new(color, size, color=(255, 255, 255))
+
+@functools.lru_cache(maxsize=16)
+def _encoded_test_image(format, size, mode):
+    """编码测试图片，相同参数只编码一次"""
+    # 白色背景，PIL会按mode转换颜色（L模式为255，RGB模式为(255, 255, 255)）
+    img = Image.new(mode, size, color="white")
     img_bytes = io.BytesIO()
     img.save(img_bytes, format=format)
-    img_bytes.seek(0)
-    return img_bytes
+    return img_bytes.getvalue()
+
+
+def create_test_image(format="PNG", size=(100, 100), mode="L") -> bytes:
+    """创建测试图片，默认使用单通道灰度图，只需要合法图片的测试无需RGB"""
+    # 直接返回缓存的bytes，httpx可直接编码进multipart，无需再包一层BytesIO；
+    # bytes不可变，可在测试之间安全共享
+    return _encoded_test_image(format, size, mode)
+
+
+@pytest.fixture(scope="session")
+def oversized_png_path(tmp_path_factory) -> Path:
+    """生成一次超过上传大小限制的PNG图片文件，整个测试会话内复用"""
+    # 直接用随机字节构造像素数据，随机内容无法被PNG压缩，确保文件大小超过限制
+    # 不压缩时每像素约占3字节，边长只需略大于 sqrt(上限/3)
+    side = math.isqrt(settings.max_upload_size // 3) + 64
+    size = (side, side)
+    img = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    
+    image_path = tmp_path_factory.mktemp("oversized") / "large_image.png"
+    img.save(image_path, format='PNG', compress_level=0)  # 不压缩以增加文件大小
+    assert image_path.stat().st_size > settings.max_upload_size
+    return image_path
+
+
+def _stream_multipart_file(path: Path, boundary: str, filename: str, content_type: str,
+                           chunk_size: int = 256 * 1024):
+    """按块生成只含一个file字段的multipart请求体"""
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    with path.open("rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
 
 
 def create_test_file(content="test content", filename="test.txt"):
@@ -29,6 +74,40 @@ def create_test_file(content="test content", filename="test.txt"):
     return file_bytes
 
 
+@pytest.fixture
+def mock_ocr(monkeypatch):
+    """用固定结果替换OCR服务，避免调用真实的OCR接口"""
+    ocr_service = Mock()
+    ocr_service.extract_text_from_image = AsyncMock(return_value=OCRResult(success=True, confidence=1.0))
+    monkeypatch.setattr("backend.api.upload.create_ocr_service", lambda: ocr_service)
+    return ocr_service
+
+
+@pytest.fixture
+def uploaded_file_id(client: TestClient, auth_headers: dict) -> str:
+    """预先上传一张图片（不自动OCR），返回file_id供依赖已上传文件的测试复用"""
+    files = {
+        "file": ("test_image.png", create_test_image(), "image/png")
+    }
+    data = {
+        "auto_ocr": "false"
+    }
+    
+    response = client.post("/api/upload/file", files=files, data=data, headers=auth_headers)
+    assert response.status_code == 200
+    return response.json()["file_id"]
+
+
+def _mock_upload(filename, content_type):
+    """构造用于验证的UploadFile"""
+    # 使用headers参数设置content_type
+    return UploadFile(
+        filename=filename,
+        file=io.BytesIO(b"fake file data"),
+        headers={"content-type": content_type}
+    )
+
+
 class TestUploadAPI:
     """文件上传API测试类"""
     
@@ -80,54 +159,43 @@ class TestUploadAPI:
         assert response.status_code == 400
         assert "不支持的文件类型" in response.json()["detail"]
     
-    def test_upload_image_too_large(self, client: TestClient, auth_headers: dict):
-        """测试上传过大文件"""
-        # 创建一个真正超过10MB的大图片
-        # 使用更大的尺寸和更复杂的内容来确保文件大小超过限制
-        large_image = create_test_image(size=(10000, 10000))
-        
-        # 如果还不够大，创建一个包含随机数据的更大图片
-        from PIL import Image
-        import random
-        
-        # 创建一个包含随机像素的大图片
-        img = Image.new('RGB', (8000, 8000))
-        pixels = []
-        for i in range(8000 * 8000):
-            pixels.append((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
-        img.putdata(pixels)
-        
-        img_bytes = io.BytesIO()
-        img.save(img_bytes, format='PNG', compress_level=0)  # 不压缩以增加文件大小
-        img_bytes.seek(0)
-        
+    def test_upload_declared_too_large(self, client: TestClient, auth_headers: dict):
+        """测试Content-Length超过限制时直接拒绝，无需发送真实的大文件"""
         files = {
-            "file": ("large_image.png", img_bytes, "image/png")
+            "file": ("large_image.png", io.BytesIO(b"\x89PNG\r\n\x1a\n" + b"\0" * 64), "image/png")
         }
+        headers = {"Content-Length": str(settings.max_upload_size * 2), **auth_headers}
         
-        response = client.post("/api/upload/file", files=files, headers=auth_headers)
+        response = client.post("/api/upload/file", files=files, headers=headers)
+        
+        assert response.status_code == 400
+        assert "文件过大" in response.json()["detail"]
+    
+    @pytest.mark.slow
+    def test_upload_image_too_large(self, client: TestClient, auth_headers: dict, oversized_png_path: Path):
+        """测试上传过大文件"""
+        # 以生成器流式发送multipart请求体，客户端不必一次性构造整个请求体
+        boundary = uuid.uuid4().hex
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}", **auth_headers}
+        
+        response = client.post(
+            "/api/upload/file",
+            content=_stream_multipart_file(oversized_png_path, boundary, "large_image.png", "image/png"),
+            headers=headers
+        )
         
         # 应该返回400错误，因为文件过大
         assert response.status_code == 400
         assert "文件过大" in response.json()["detail"]
     
-    def test_upload_image_with_session_id(self, client: TestClient, auth_headers: dict):
+    def test_upload_image_with_session_id(self, client: TestClient, auth_headers: dict, created_session: str):
         """测试带会话ID上传图片"""
-        # 先创建一个会话
-        session_data = {
-            "target_url": "https://example.com",
-            "session_name": "测试会话"
-        }
-        session_response = client.post("/api/chat/sessions", json=session_data, headers=auth_headers)
-        session_id = session_response.json()["session_id"]
-        
-        # 上传图片
         test_image = create_test_image()
         files = {
             "file": ("test_image.png", test_image, "image/png")
         }
         data = {
-            "session_id": session_id,
+            "session_id": created_session,
             "auto_ocr": "false"
         }
         
@@ -137,19 +205,24 @@ class TestUploadAPI:
         result = response.json()
         assert "file_id" in result
     
-    def test_process_ocr(self, client: TestClient, auth_headers: dict):
+    def test_process_ocr(self, client: TestClient, auth_headers: dict, uploaded_file_id: str, mock_ocr):
         """测试OCR处理"""
-        # 先上传一个图片（不自动OCR）
-        test_image = create_test_image()
-        files = {
-            "file": ("test_image.png", test_image, "image/png")
-        }
-        data = {
-            "auto_ocr": "false"
-        }
+        file_id = uploaded_file_id
         
-        upload_response = client.post("/api/upload/file", files=files, data=data, headers=auth_headers)
-        file_id = upload_response.json()["file_id"]
+        # 手动触发OCR
+        response = client.post(f"/api/upload/ocr/{file_id}", headers=auth_headers)
+        
+        assert response.status_code == 200
+        result = response.json()
+        assert result["file_id"] == file_id
+        assert result["status"] == "completed"
+        assert result["ocr_result"]["success"] is True
+        mock_ocr.extract_text_from_image.assert_awaited_once()
+    
+    @pytest.mark.slow
+    def test_process_ocr_real_service(self, client: TestClient, auth_headers: dict, uploaded_file_id: str):
+        """测试使用真实OCR服务处理"""
+        file_id = uploaded_file_id
         
         # 手动触发OCR
         response = client.post(f"/api/upload/ocr/{file_id}", headers=auth_headers)
@@ -179,19 +252,9 @@ class TestUploadAPI:
         
         assert response.status_code == 403
     
-    def test_get_file_info(self, client: TestClient, auth_headers: dict):
+    def test_get_file_info(self, client: TestClient, auth_headers: dict, uploaded_file_id: str):
         """测试获取文件信息"""
-        # 先上传一个文件
-        test_image = create_test_image()
-        files = {
-            "file": ("test_image.png", test_image, "image/png")
-        }
-        data = {
-            "auto_ocr": "false"
-        }
-        
-        upload_response = client.post("/api/upload/file", files=files, data=data, headers=auth_headers)
-        file_id = upload_response.json()["file_id"]
+        file_id = uploaded_file_id
         
         # 获取文件信息
         response = client.get(f"/api/upload/files/{file_id}", headers=auth_headers)
@@ -221,19 +284,9 @@ class TestUploadAPI:
         
         assert response.status_code == 403
     
-    def test_delete_file(self, client: TestClient, auth_headers: dict):
+    def test_delete_file(self, client: TestClient, auth_headers: dict, uploaded_file_id: str):
         """测试删除文件"""
-        # 先上传一个文件
-        test_image = create_test_image()
-        files = {
-            "file": ("test_image.png", test_image, "image/png")
-        }
-        data = {
-            "auto_ocr": "false"
-        }
-        
-        upload_response = client.post("/api/upload/file", files=files, data=data, headers=auth_headers)
-        file_id = upload_response.json()["file_id"]
+        file_id = uploaded_file_id
         
         # 删除文件
         response = client.delete(f"/api/upload/files/{file_id}", headers=auth_headers)
@@ -268,18 +321,8 @@ class TestUploadAPI:
 class TestUploadAPIAsync:
     """文件上传API异步测试类"""
     
-    async def test_upload_image_async(self, async_client: AsyncClient, test_user_data: dict):
+    async def test_upload_image_async(self, async_client: AsyncClient, auth_headers: dict):
         """测试异步上传图片"""
-        # 先注册和登录用户
-        await async_client.post("/api/auth/register", json=test_user_data)
-        login_response = await async_client.post("/api/auth/login", json={
-            "username": test_user_data["username"],
-            "password": test_user_data["password"]
-        })
-        
-        token = login_response.json()["access_token"]
-        headers = {"Authorization": f"Bearer {token}"}
-        
         # 创建测试图片
         test_image = create_test_image()
         
@@ -290,7 +333,7 @@ class TestUploadAPIAsync:
             "auto_ocr": "false"
         }
         
-        response = await async_client.post("/api/upload/file", files=files, data=data, headers=headers)
+        response = await async_client.post("/api/upload/file", files=files, data=data, headers=auth_headers)
         
         assert response.status_code == 200
         result = response.json()
@@ -301,62 +344,22 @@ class TestUploadAPIAsync:
 class TestFileValidation:
     """文件验证测试类"""
     
-    def test_validate_file_valid_types(self):
-        """测试验证有效文件类型"""
-        from backend.api.upload import validate_file
-        from fastapi import UploadFile
-        
-        # 模拟有效的文件类型
-        valid_types = [
-            ("test.jpg", "image/jpeg"),
-            ("test.png", "image/png"),
-            ("test.jpeg", "image/jpeg"),
-            ("test.pdf", "application/pdf")
-        ]
-        
-        for filename, content_type in valid_types:
-            # 使用headers参数设置content_type
-            mock_file = UploadFile(
-                filename=filename, 
-                file=io.BytesIO(b"fake file data"),
-                headers={"content-type": content_type}
-            )
-            
-            assert validate_file(mock_file) is True
-    
-    def test_validate_file_invalid_types(self):
-        """测试验证无效文件类型"""
-        from backend.api.upload import validate_file
-        from fastapi import UploadFile
-        
-        # 模拟无效的文件类型
-        invalid_types = [
-            ("test.txt", "text/plain"),
-            ("test.doc", "application/msword"),
-            ("test.mp4", "video/mp4"),
-            ("test.zip", "application/zip")
-        ]
-        
-        for filename, content_type in invalid_types:
-            # 使用headers参数设置content_type
-            mock_file = UploadFile(
-                filename=filename, 
-                file=io.BytesIO(b"fake file data"),
-                headers={"content-type": content_type}
-            )
-            
-            assert validate_file(mock_file) is False
-    
-    def test_validate_file_invalid_extension(self):
-        """测试验证无效文件扩展名"""
-        from backend.api.upload import validate_file
-        from fastapi import UploadFile
-        
+    @pytest.mark.parametrize("filename,content_type,expected", [
+        # 有效的文件类型
+        ("test.jpg", "image/jpeg", True),
+        ("test.png", "image/png", True),
+        ("test.jpeg", "image/jpeg", True),
+        ("test.pdf", "application/pdf", True),
+        # 无效的文件类型
+        ("test.txt", "text/plain", False),
+        ("test.doc", "application/msword", False),
+        ("test.mp4", "video/mp4", False),
+        ("test.zip", "application/zip", False),
         # 内容类型正确但扩展名错误
-        mock_file = UploadFile(
-            filename="test.txt", 
-            file=io.BytesIO(b"fake file data"),
-            headers={"content-type": "image/png"}
-        )
+        ("test.txt", "image/png", False),
+    ])
+    def test_validate_file(self, filename, content_type, expected):
+        """测试验证文件类型和扩展名"""
+        from backend.api.upload import validate_file
         
-        assert validate_file(mock_file) is False
\ No newline at end of file
+        assert validate_file(_mock_upload(filename, content_type)) is expected
@@ -3,11 +3,15 @@
 增强版阿里云OCR测试程序
 基于官方sample.py，添加了图片数据和环境变量配置
 """
+import asyncio
+import functools
+import gzip
+import io
 import os
 import sys
-import base64
-from typing import List
+import orjson
 from dotenv import load_dotenv
+from PIL import Image
 
 from alibabacloud_ocr_api20210707.client import Client as ocr_api20210707Client
 from alibabacloud_credentials.client import Client as CredentialClient
@@ -19,53 +23,81 @@ from alibabacloud_tea_console.client import Client as ConsoleClient
 from alibabacloud_tea_util.client import Client as UtilClient
 
 
-class EnhancedSample:
-    def __init__(self):
-        # 加载环境变量
+_ENV_LOADED = False
+
+
+def _ensure_env() -> None:
+    """加载.env环境变量，多次调用只会解析一次文件"""
+    global _ENV_LOADED
+    if not _ENV_LOADED:
         load_dotenv()
-        
+        _ENV_LOADED = True
+
+
+@functools.lru_cache(maxsize=1)
+def create_client() -> ocr_api20210707Client:
+    """
+    使用凭据初始化账号Client，只创建一次，后续调用复用同一个Client
+    @return: Client
+    @throws Exception
+    """
+    # 从环境变量获取密钥 - 支持多种环境变量名称
+    access_key_id = (os.getenv('ALIBABA_CLOUD_ACCESS_KEY_ID') or 
+                    os.getenv('ALIYUN_ACCESS_KEY_ID'))
+    access_key_secret = (os.getenv('ALIBABA_CLOUD_ACCESS_KEY_SECRET') or 
+                       os.getenv('ALIYUN_ACCESS_KEY_SECRET'))
+    
+    print(f"Access Key ID: {'已配置' if access_key_id else '未配置'} ({access_key_id[:10] + '...' if access_key_id else 'None'})")
+    print(f"Access Key Secret: {'已配置' if access_key_secret else '未配置'} ({'***' if access_key_secret else 'None'})")
+    
+    if access_key_id and access_key_secret:
+        # 使用明确的AccessKey配置
+        credential_config = CredentialConfig(
+            type='access_key',
+            access_key_id=access_key_id,
+            access_key_secret=access_key_secret
+        )
+        credential = CredentialClient(credential_config)
+    else:
+        # 使用默认凭据链
+        credential = CredentialClient()
+    
+    config = open_api_models.Config(
+        credential=credential
+    )
+    # Endpoint 请参考 https://api.aliyun.com/product/ocr-api
+    config.endpoint = f'ocr-api.cn-hangzhou.aliyuncs.com'
+    return ocr_api20210707Client(config)
+
+
+def save_result(filename: str, content: str) -> None:
+    """将OCR结果以gzip压缩写入文件，可用 zcat / gzip -dc 查看"""
+    with gzip.open(filename, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(content)
+
+
+class EnhancedSample:
     @staticmethod
-    def create_client() -> ocr_api20210707Client:
+    def downscale_image(image_data: bytes, max_dim: int) -> bytes:
         """
-        使用凭据初始化账号Client
-        @return: Client
-        @throws Exception
+        将图片最长边缩小到max_dim以内，并重新编码为JPEG以减少上传数据量
+        @return: 缩放后的JPEG数据；图片未超过限制时原样返回
         """
-        # 加载环境变量
-        load_dotenv()
+        img = Image.open(io.BytesIO(image_data))
+        if max(img.size) <= max_dim:
+            return image_data
         
-        # 从环境变量获取密钥 - 支持多种环境变量名称
-        access_key_id = (os.getenv('ALIBABA_CLOUD_ACCESS_KEY_ID') or 
-                        os.getenv('ALIYUN_ACCESS_KEY_ID'))
-        access_key_secret = (os.getenv('ALIBABA_CLOUD_ACCESS_KEY_SECRET') or 
-                           os.getenv('ALIYUN_ACCESS_KEY_SECRET'))
-        
-        print(f"Access Key ID: {'已配置' if access_key_id else '未配置'} ({access_key_id[:10] + '...' if access_key_id else 'None'})")
-        print(f"Access Key Secret: {'已配置' if access_key_secret else '未配置'} ({'***' if access_key_secret else 'None'})")
-        
-        if access_key_id and access_key_secret:
-            # 使用明确的AccessKey配置
-            credential_config = CredentialConfig(
-                type='access_key',
-                access_key_id=access_key_id,
-                access_key_secret=access_key_secret
-            )
-            credential = CredentialClient(credential_config)
-        else:
-            # 使用默认凭据链
-            credential = CredentialClient()
-        
-        config = open_api_models.Config(
-            credential=credential
-        )
-        # Endpoint 请参考 https://api.aliyun.com/product/ocr-api
-        config.endpoint = f'ocr-api.cn-hangzhou.aliyuncs.com'
-        return ocr_api20210707Client(config)
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+        print(f"图片已缩放: {img.size[0]}x{img.size[1]}, {buffer.tell()} bytes")
+        return buffer.getvalue()
 
     @staticmethod
     def load_test_image() -> bytes:
         """
         加载测试图片
+        设置环境变量OCR_MAX_DIM（如2048）时，会先将图片最长边缩小到该值以内
         @return: 图片的二进制数据
         """
         # 使用绝对路径
@@ -73,19 +105,28 @@ class EnhancedSample:
         project_root = os.path.dirname(current_dir)
         test_image_path = os.path.join(project_root, "backend/tests/test_data/test_invoice.jpg")
         
-        if not os.path.exists(test_image_path):
-            raise FileNotFoundError(f"测试图片不存在: {test_image_path}")
-        
-        print(f"测试图片: {test_image_path}")
-        print(f"图片大小: {os.path.getsize(test_image_path)} bytes")
+        # 直接打开文件，存在性检查和大小都从同一个文件描述符获得
+        try:
+            fd = os.open(test_image_path, os.O_RDONLY)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"测试图片不存在: {test_image_path}") from None
         
-        with open(test_image_path, 'rb') as f:
+        # 文件对象接管描述符，退出with时一并关闭
+        with os.fdopen(fd, 'rb') as f:
+            print(f"测试图片: {test_image_path}")
+            print(f"图片大小: {os.fstat(fd).st_size} bytes")
+            
+            # SDK在签名前总会把请求体读成bytes，这里直接读出bytes交给SDK
             image_data = f.read()
         
+        max_dim = int(os.getenv('OCR_MAX_DIM', '0'))
+        if max_dim > 0:
+            image_data = EnhancedSample.downscale_image(image_data, max_dim)
+        
         return image_data
 
     @staticmethod
-    def main(args: List[str]) -> None:
+    def main(args: list[str]) -> None:
         """
         同步方式测试OCR
         """
@@ -93,9 +134,11 @@ class EnhancedSample:
         print(" 增强版阿里云OCR测试程序 - 同步调用")
         print("="*60)
         
+        _ensure_env()
+        
         try:
             # 创建客户端
-            client = EnhancedSample.create_client()
+            client = create_client()
             
             # 加载测试图片
             image_data = EnhancedSample.load_test_image()
@@ -122,9 +165,8 @@ class EnhancedSample:
             print(response_json)
             
             # 保存结果到文件
-            with open("poc_ocr_result.json", "w", encoding="utf-8") as f:
-                f.write(response_json)
-            print(f"\n结果已保存到: poc_ocr_result.json")
+            save_result("poc_ocr_result.json.gz", response_json)
+            print(f"\n结果已保存到: poc_ocr_result.json.gz")
             
         except Exception as error:
             print("\n" + "="*60)
@@ -149,13 +191,13 @@ class EnhancedSample:
                 "recommend": getattr(error, 'data', {}).get('Recommend') if hasattr(error, 'data') and error.data else None
             }
             
-            with open("poc_ocr_error.json", "w", encoding="utf-8") as f:
-                import json
-                json.dump(error_info, f, indent=2, ensure_ascii=False)
+            # orjson一次性生成UTF-8编码的完整内容，只需一次写入
+            with open("poc_ocr_error.json", "wb") as f:
+                f.write(orjson.dumps(error_info, option=orjson.OPT_INDENT_2))
             print(f"错误信息已保存到: poc_ocr_error.json")
 
     @staticmethod
-    async def main_async(args: List[str]) -> None:
+    async def main_async(args: list[str]) -> None:
         """
         异步方式测试OCR
         """
@@ -163,9 +205,11 @@ class EnhancedSample:
         print(" 增强版阿里云OCR测试程序 - 异步调用")
         print("="*60)
         
+        _ensure_env()
+        
         try:
             # 创建客户端
-            client = EnhancedSample.create_client()
+            client = create_client()
             
             # 加载测试图片
             image_data = EnhancedSample.load_test_image()
@@ -191,10 +235,9 @@ class EnhancedSample:
             print("响应内容:")
             print(response_json)
             
-            # 保存结果到文件
-            with open("poc_ocr_async_result.json", "w", encoding="utf-8") as f:
-                f.write(response_json)
-            print(f"\n异步结果已保存到: poc_ocr_async_result.json")
+            # 保存结果到文件，在线程中写入，避免阻塞事件循环上的其他任务
+            await asyncio.to_thread(save_result, "poc_ocr_async_result.json.gz", response_json)
+            print(f"\n异步结果已保存到: poc_ocr_async_result.json.gz")
             
         except Exception as error:
             print("\n" + "="*60)
@@ -223,9 +266,12 @@ async def test_async():
     await EnhancedSample.main_async([])
 
 
+async def test_both():
+    """同时发起同步和异步调用，两次OCR请求互不依赖，无需串行等待"""
+    await asyncio.gather(asyncio.to_thread(test_sync), test_async())
+
+
 if __name__ == '__main__':
-    import asyncio
-    
     print("选择测试模式:")
     print("1. 同步调用")
     print("2. 异步调用")
@@ -238,11 +284,7 @@ if __name__ == '__main__':
     elif choice == "2":
         asyncio.run(test_async())
     elif choice == "3":
-        test_sync()
-        print("\n" + "="*60)
-        print(" 开始异步测试")
-        print("="*60)
-        asyncio.run(test_async())
+        asyncio.run(test_both())
     else:
         print("无效选择，使用默认同步调用")
         test_sync()
\ No newline at end of file
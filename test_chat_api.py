@@ -4,25 +4,29 @@
 模拟前端的完整流程：登录 -> 创建会话 -> 发送消息
 """
 
-import requests
-import json
+import aiohttp
+import asyncio
+import orjson
 import time
-import websocket
-import threading
-from typing import Optional
+import websockets
+from typing import Dict, Optional
 
 class ChatAPITester:
-    def __init__(self, base_url: str = "http://localhost:8888"):
+    def __init__(self, http: aiohttp.ClientSession, base_url: str = "http://localhost:8888"):
+        self.http = http  # 共享连接池，顺序请求复用同一个keep-alive连接
         self.base_url = base_url
+        self.register_url = f"{base_url}/api/auth/register"
+        self.login_url = f"{base_url}/api/auth/login"
+        self.sessions_url = f"{base_url}/api/chat/sessions"
         self.token: Optional[str] = None
+        self.auth_headers: Dict[str, str] = {}  # 登录成功后生成一次，后续请求复用
         self.session_id: Optional[str] = None
-        self.ws: Optional[websocket.WebSocket] = None
-        
-    def login(self, username: str = "test@example.com", password: str = "testpassword") -> bool:
-        """登录获取token"""
-        print("🔐 开始登录...")
-        
-        # 首先尝试注册用户（如果不存在）
+        self.ws: Optional[websockets.WebSocketClientProtocol] = None
+        self.ws_receiver: Optional[asyncio.Task] = None
+        self.reply_event = asyncio.Event()  # 收到完整回复（或错误）时置位
+    
+    async def register(self, username: str, password: str):
+        """尝试注册用户（如果不存在）"""
         register_data = {
             "username": username,
             "email": username,
@@ -30,46 +34,54 @@ class ChatAPITester:
         }
         
         try:
-            register_response = requests.post(f"{self.base_url}/api/auth/register", json=register_data)
-            if register_response.status_code == 200:
-                print("✅ 用户注册成功")
-            else:
-                print("ℹ️ 用户可能已存在，继续登录...")
+            async with self.http.post(self.register_url, json=register_data) as register_response:
+                if register_response.status == 200:
+                    print("✅ 用户注册成功")
+                else:
+                    print("ℹ️ 用户可能已存在，继续登录...")
         except Exception as e:
             print(f"注册请求失败: {e}")
+    
+    async def login(self, username: str = "test@example.com", password: str = "testpassword") -> bool:
+        """登录获取token"""
+        print("🔐 开始登录...")
         
-        # 登录
+        # 注册与登录的是不同账号，两个请求互不依赖，并发发出
+        _, logged_in = await asyncio.gather(
+            self.register(username, password),
+            self.request_token()
+        )
+        return logged_in
+    
+    async def request_token(self) -> bool:
+        """使用测试账号登录并保存token"""
         login_data = {
             "username": "chattest",
             "password": "chattest123"
         }
         
         try:
-            response = requests.post(f"{self.base_url}/api/auth/login", json=login_data)
-            if response.status_code == 200:
-                result = response.json()
-                self.token = result.get("access_token")
-                print(f"✅ 登录成功，获取token: {self.token[:20]}...")
-                return True
-            else:
-                print(f"❌ 登录失败: {response.status_code} - {response.text}")
-                return False
+            async with self.http.post(self.login_url, json=login_data) as response:
+                if response.status == 200:
+                    result = await response.json(loads=orjson.loads)
+                    self.token = result.get("access_token")
+                    self.auth_headers = {"Authorization": f"Bearer {self.token}"}
+                    print(f"✅ 登录成功，获取token: {self.token[:20]}...")
+                    return True
+                else:
+                    print(f"❌ 登录失败: {response.status} - {await response.text()}")
+                    return False
         except Exception as e:
             print(f"❌ 登录请求失败: {e}")
             return False
     
-    def create_session(self) -> bool:
+    async def create_session(self) -> bool:
         """创建聊天会话"""
         if not self.token:
             print("❌ 未登录，无法创建会话")
             return False
-            
-        print("💬 创建聊天会话...")
         
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
+        print("💬 创建聊天会话...")
         
         session_data = {
             "session_name": f"测试会话_{int(time.time())}",
@@ -77,107 +89,91 @@ class ChatAPITester:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/api/chat/sessions", 
-                                   json=session_data, headers=headers)
-            if response.status_code == 200:
-                result = response.json()
-                self.session_id = result.get("session_id")
-                print(f"✅ 会话创建成功，会话ID: {self.session_id}")
-                print(f"   会话名称: {result.get('session_name')}")
-                print(f"   创建时间: {result.get('created_at')}")
-                return True
-            else:
-                print(f"❌ 创建会话失败: {response.status_code} - {response.text}")
-                return False
+            # json参数会自动设置Content-Type: application/json
+            async with self.http.post(self.sessions_url,
+                                      json=session_data, headers=self.auth_headers) as response:
+                if response.status == 200:
+                    result = await response.json(loads=orjson.loads)
+                    self.session_id = result.get("session_id")
+                    print(f"✅ 会话创建成功，会话ID: {self.session_id}")
+                    print(f"   会话名称: {result.get('session_name')}")
+                    print(f"   创建时间: {result.get('created_at')}")
+                    return True
+                else:
+                    print(f"❌ 创建会话失败: {response.status} - {await response.text()}")
+                    return False
         except Exception as e:
             print(f"❌ 创建会话请求失败: {e}")
             return False
     
-    def get_sessions(self) -> bool:
+    async def get_sessions(self) -> bool:
         """获取用户的所有会话"""
         if not self.token:
             print("❌ 未登录，无法获取会话列表")
             return False
-            
-        print("📋 获取会话列表...")
         
-        headers = {
-            "Authorization": f"Bearer {self.token}"
-        }
+        print("📋 获取会话列表...")
         
         try:
-            response = requests.get(f"{self.base_url}/api/chat/sessions", headers=headers)
-            if response.status_code == 200:
-                sessions = response.json()
-                print(f"✅ 获取到 {len(sessions)} 个会话:")
-                for session in sessions:
-                    print(f"   - {session.get('session_name')} ({session.get('session_id')})")
-                return True
-            else:
-                print(f"❌ 获取会话列表失败: {response.status_code} - {response.text}")
-                return False
+            async with self.http.get(self.sessions_url, headers=self.auth_headers) as response:
+                if response.status == 200:
+                    sessions = await response.json(loads=orjson.loads)
+                    print(f"✅ 获取到 {len(sessions)} 个会话:")
+                    for session in sessions:
+                        print(f"   - {session.get('session_name')} ({session.get('session_id')})")
+                    return True
+                else:
+                    print(f"❌ 获取会话列表失败: {response.status} - {await response.text()}")
+                    return False
         except Exception as e:
             print(f"❌ 获取会话列表请求失败: {e}")
             return False
     
-    def on_websocket_message(self, ws, message):
-        """WebSocket消息处理"""
+    async def receive_websocket_messages(self):
+        """持续接收WebSocket消息，直到连接关闭"""
         try:
-            data = json.loads(message)
-            print(f"📨 收到WebSocket消息: {data}")
+            async for message in self.ws:
+                try:
+                    data = orjson.loads(message)
+                    print(f"📨 收到WebSocket消息: {data}")
+                    if data.get("type") in ("message_complete", "error"):
+                        self.reply_event.set()
+                except Exception as e:
+                    print(f"❌ 解析WebSocket消息失败: {e}")
+        except websockets.ConnectionClosed as e:
+            print(f"🔌 WebSocket连接已关闭: {e.code} - {e.reason}")
         except Exception as e:
-            print(f"❌ 解析WebSocket消息失败: {e}")
-    
-    def on_websocket_error(self, ws, error):
-        """WebSocket错误处理"""
-        print(f"❌ WebSocket错误: {error}")
+            print(f"❌ WebSocket错误: {e}")
     
-    def on_websocket_close(self, ws, close_status_code, close_msg):
-        """WebSocket关闭处理"""
-        print(f"🔌 WebSocket连接已关闭: {close_status_code} - {close_msg}")
-    
-    def on_websocket_open(self, ws):
-        """WebSocket连接打开"""
-        print("✅ WebSocket连接已建立")
-    
-    def connect_websocket(self) -> bool:
+    async def connect_websocket(self) -> bool:
         """连接WebSocket"""
         if not self.token or not self.session_id:
             print("❌ 缺少token或session_id，无法连接WebSocket")
             return False
-            
+        
         print("🔌 连接WebSocket...")
         
         ws_url = f"ws://localhost:8888/api/chat/ws/{self.session_id}?token={self.token}"
         
         try:
-            self.ws = websocket.WebSocketApp(
-                ws_url,
-                on_message=self.on_websocket_message,
-                on_error=self.on_websocket_error,
-                on_close=self.on_websocket_close,
-                on_open=self.on_websocket_open
-            )
-            
-            # 在后台线程中运行WebSocket
-            ws_thread = threading.Thread(target=self.ws.run_forever)
-            ws_thread.daemon = True
-            ws_thread.start()
+            # connect返回时握手已完成，无需再额外等待连接建立
+            self.ws = await websockets.connect(ws_url)
+            print("✅ WebSocket连接已建立")
             
-            # 等待连接建立
-            time.sleep(2)
+            # 在后台任务中接收消息
+            self.ws_receiver = asyncio.create_task(self.receive_websocket_messages())
             return True
-            
+        
         except Exception as e:
             print(f"❌ WebSocket连接失败: {e}")
             return False
     
-    def send_message(self, message: str) -> bool:
+    async def send_message(self, message: str) -> bool:
         """通过WebSocket发送消息"""
         if not self.ws:
             print("❌ WebSocket未连接")
             return False
-            
+        
         print(f"📤 发送消息: {message}")
         
         message_data = {
@@ -187,36 +183,48 @@ class ChatAPITester:
         }
         
         try:
-            self.ws.send(json.dumps(message_data))
+            self.reply_event.clear()
+            await self.ws.send(orjson.dumps(message_data).decode())
             return True
         except Exception as e:
             print(f"❌ 发送消息失败: {e}")
             return False
     
-    def test_complete_flow(self):
+    async def wait_for_reply(self, timeout: float = 30.0) -> bool:
+        """等待当前消息的完整回复，收到后立即返回，无需固定等待"""
+        try:
+            await asyncio.wait_for(self.reply_event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"⏰ {timeout:.0f}秒内未收到回复")
+            return False
+    
+    async def close(self):
+        """关闭WebSocket连接并等待接收任务结束"""
+        if self.ws:
+            await self.ws.close()
+        if self.ws_receiver:
+            await self.ws_receiver
+    
+    async def test_complete_flow(self):
         """测试完整的聊天流程"""
         print("🚀 开始测试完整的聊天流程...\n")
         
         # 1. 登录
-        if not self.login():
+        if not await self.login():
             return False
         
         print()
         
         # 2. 创建会话
-        if not self.create_session():
-            return False
-        
-        print()
-        
-        # 3. 获取会话列表
-        if not self.get_sessions():
+        if not await self.create_session():
             return False
         
         print()
         
-        # 4. 连接WebSocket
-        if not self.connect_websocket():
+        # 3. 获取会话列表，同时 4. 连接WebSocket（两者都只依赖已创建的会话）
+        got_sessions, connected = await asyncio.gather(self.get_sessions(), self.connect_websocket())
+        if not got_sessions or not connected:
             return False
         
         print()
@@ -229,39 +237,43 @@ class ChatAPITester:
         ]
         
         for msg in test_messages:
-            if self.send_message(msg):
+            if await self.send_message(msg):
                 print("✅ 消息发送成功")
-                time.sleep(2)  # 等待响应
+                await self.wait_for_reply()
             else:
                 print("❌ 消息发送失败")
             print()
         
         print("🎉 测试完成！")
         
-        # 保持连接一段时间以接收响应
-        print("⏳ 等待响应中...")
-        time.sleep(10)
-        
         return True
 
-def main():
+async def main():
     """主函数"""
     print("=" * 50)
     print("🧪 Chat API 测试工具")
     print("=" * 50)
     
-    tester = ChatAPITester()
+    connector = aiohttp.TCPConnector(limit=20, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        tester = ChatAPITester(http)
+        
+        try:
+            await tester.test_complete_flow()
+        except Exception as e:
+            print(f"\n❌ 测试过程中发生错误: {e}")
+        finally:
+            await tester.close()
+            print("\n🔚 测试结束")
+
+if __name__ == "__main__":
+    try:
+        import uvloop  # uvicorn[standard]在Linux/macOS上会安装uvloop，Windows下不可用
+        uvloop.install()
+    except ImportError:
+        pass
     
     try:
-        tester.test_complete_flow()
+        asyncio.run(main())
     except KeyboardInterrupt:
         print("\n👋 测试被用户中断")
-    except Exception as e:
-        print(f"\n❌ 测试过程中发生错误: {e}")
-    finally:
-        if tester.ws:
-            tester.ws.close()
-        print("\n🔚 测试结束")
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
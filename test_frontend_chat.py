@@ -2,120 +2,156 @@
 """
 前端聊天功能测试脚本
 模拟前端页面发送"你好，智能体"消息并等待大模型回复
+
+环境变量:
+    CHAT_SESSIONS     同时测试的会话数量，默认1
+    CHAT_CONCURRENCY  同时进行中的会话上限，默认5
 """
 
+import aiohttp
 import asyncio
+import os
 import websockets
-import json
-import requests
+import orjson
 from datetime import datetime
 
 BASE_URL = "http://localhost:8888"
+CHAT_SESSIONS = int(os.getenv("CHAT_SESSIONS", "1"))
+CHAT_CONCURRENCY = int(os.getenv("CHAT_CONCURRENCY", "5"))
 
-async def test_frontend_chat():
-    """测试前端聊天功能"""
-    print("🚀 开始前端聊天功能测试...")
+async def login(http: aiohttp.ClientSession):
+    """用户登录，返回access_token，失败时返回None"""
+    print("\n🔐 用户登录...")
+    login_data = {
+        "username": "chattest",
+        "password": "chattest123"
+    }
     
-    try:
-        # 1. 用户登录
-        print("\n🔐 用户登录...")
-        login_data = {
-            "username": "chattest",
-            "password": "chattest123"
-        }
+    async with http.post(f"{BASE_URL}/api/auth/login", json=login_data) as response:
+        if response.status != 200:
+            print(f"❌ 登录失败: {response.status} - {await response.text()}")
+            return None
         
-        response = requests.post(f"{BASE_URL}/api/auth/login", json=login_data)
-        if response.status_code != 200:
-            print(f"❌ 登录失败: {response.status_code} - {response.text}")
+        login_result = await response.json(loads=orjson.loads)
+    
+    access_token = login_result["access_token"]
+    user_info = login_result["user"]
+    print(f"✅ 登录成功，用户: {user_info['username']}")
+    return access_token
+
+async def run_one_session(http: aiohttp.ClientSession, access_token: str, index: int):
+    """创建一个会话，发送测试消息并等待大模型回复"""
+    tag = f"[会话{index}]"
+    
+    # 2. 创建聊天会话
+    print(f"\n{tag} 💬 创建聊天会话...")
+    session_data = {
+        "name": f"前端测试会话_{int(datetime.now().timestamp())}_{index}"
+    }
+    
+    headers = {"Authorization": f"Bearer {access_token}"}
+    async with http.post(f"{BASE_URL}/api/chat/sessions", json=session_data, headers=headers) as response:
+        if response.status != 200:
+            print(f"{tag} ❌ 创建会话失败: {response.status} - {await response.text()}")
             return
         
-        login_result = response.json()
-        access_token = login_result["access_token"]
-        user_info = login_result["user"]
-        print(f"✅ 登录成功，用户: {user_info['username']}")
-        
-        # 2. 创建聊天会话
-        print("\n💬 创建聊天会话...")
-        session_data = {
-            "name": f"前端测试会话_{int(datetime.now().timestamp())}"
-        }
+        session_result = await response.json(loads=orjson.loads)
+    
+    session_id = session_result["session_id"]  # 使用正确的字段名
+    print(f"{tag} ✅ 会话创建成功，会话ID: {session_id}")
+    
+    # 3. 连接WebSocket
+    print(f"\n{tag} 🔌 连接WebSocket...")
+    ws_url = f"ws://localhost:8888/api/chat/ws/{session_id}?token={access_token}"
+    
+    async with websockets.connect(ws_url) as websocket:
+        print(f"{tag} ✅ WebSocket连接已建立")
         
-        headers = {"Authorization": f"Bearer {access_token}"}
-        response = requests.post(f"{BASE_URL}/api/chat/sessions", json=session_data, headers=headers)
+        # 等待初始欢迎消息
+        try:
+            welcome_msg = await asyncio.wait_for(websocket.recv(), timeout=5.0)
+            welcome_data = orjson.loads(welcome_msg)
+            print(f"{tag} 📨 收到欢迎消息: {welcome_data.get('content', '')[:50]}...")
+        except asyncio.TimeoutError:
+            print(f"{tag} ⚠️ 未收到欢迎消息")
         
-        if response.status_code != 200:
-            print(f"❌ 创建会话失败: {response.status_code} - {response.text}")
-            return
+        # 4. 发送测试消息："你好，智能体"
+        print(f"\n{tag} 📤 发送消息: '你好，智能体'")
+        test_message = {
+            "message": "你好，智能体",
+            "type": "text"
+        }
         
-        session_result = response.json()
-        session_id = session_result["session_id"]  # 使用正确的字段名
-        print(f"✅ 会话创建成功，会话ID: {session_id}")
+        await websocket.send(orjson.dumps(test_message).decode())
+        print(f"{tag} ✅ 消息发送成功")
         
-        # 3. 连接WebSocket
-        print("\n🔌 连接WebSocket...")
-        ws_url = f"ws://localhost:8888/api/chat/ws/{session_id}?token={access_token}"
+        # 5. 等待大模型回复
+        print(f"\n{tag} ⏳ 等待大模型回复...")
+        response_count = 0
+        max_responses = 5  # 最多等待5个响应
         
-        async with websockets.connect(ws_url) as websocket:
-            print("✅ WebSocket连接已建立")
-            
-            # 等待初始欢迎消息
+        while response_count < max_responses:
             try:
-                welcome_msg = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                welcome_data = json.loads(welcome_msg)
-                print(f"📨 收到欢迎消息: {welcome_data.get('content', '')[:50]}...")
-            except asyncio.TimeoutError:
-                print("⚠️ 未收到欢迎消息")
-            
-            # 4. 发送测试消息："你好，智能体"
-            print("\n📤 发送消息: '你好，智能体'")
-            test_message = {
-                "message": "你好，智能体",
-                "type": "text"
-            }
+                response_msg = await asyncio.wait_for(websocket.recv(), timeout=30.0)
+                response_data = orjson.loads(response_msg)
+                response_count += 1
+                
+                msg_type = response_data.get('type', 'unknown')
+                content = response_data.get('content', '')
+                
+                if msg_type == 'status':
+                    print(f"{tag} 📊 状态消息: {content}")
+                elif msg_type == 'message':
+                    print(f"{tag} 🤖 AI回复: {content}")
+                    intent = response_data.get('intent', '')
+                    if intent:
+                        print(f"{tag}    意图识别: {intent}")
+                    
+                    # 如果收到正常回复消息，测试成功
+                    if content and not content.startswith("抱歉"):
+                        print(f"\n{tag} 🎉 测试成功！收到了大模型的正常回复")
+                        break
+                    elif "错误" in content or "抱歉" in content:
+                        print(f"{tag} ⚠️ 收到错误回复: {content}")
+                else:
+                    print(f"{tag} 📨 其他消息 ({msg_type}): {content}")
             
-            await websocket.send(json.dumps(test_message))
-            print("✅ 消息发送成功")
+            except asyncio.TimeoutError:
+                print(f"{tag} ⏰ 等待响应超时")
+                break
+            except orjson.JSONDecodeError as e:
+                print(f"{tag} ❌ JSON解析错误: {e}")
+                break
+        
+        print(f"\n{tag} 📊 总共收到 {response_count} 个响应")
+
+async def test_frontend_chat():
+    """测试前端聊天功能"""
+    print(f"🚀 开始前端聊天功能测试... (会话数: {CHAT_SESSIONS}, 并发上限: {CHAT_CONCURRENCY})")
+    
+    try:
+        async with aiohttp.ClientSession() as http:
+            # 1. 用户登录，所有会话共用同一个token
+            access_token = await login(http)
+            if not access_token:
+                return
             
-            # 5. 等待大模型回复
-            print("\n⏳ 等待大模型回复...")
-            response_count = 0
-            max_responses = 5  # 最多等待5个响应
+            # 各会话互不依赖，并发执行，由信号量限制同时进行的数量
+            semaphore = asyncio.Semaphore(CHAT_CONCURRENCY)
             
-            while response_count < max_responses:
-                try:
-                    response_msg = await asyncio.wait_for(websocket.recv(), timeout=30.0)
-                    response_data = json.loads(response_msg)
-                    response_count += 1
-                    
-                    msg_type = response_data.get('type', 'unknown')
-                    content = response_data.get('content', '')
-                    
-                    if msg_type == 'status':
-                        print(f"📊 状态消息: {content}")
-                    elif msg_type == 'message':
-                        print(f"🤖 AI回复: {content}")
-                        intent = response_data.get('intent', '')
-                        if intent:
-                            print(f"   意图识别: {intent}")
-                        
-                        # 如果收到正常回复消息，测试成功
-                        if content and not content.startswith("抱歉"):
-                            print("\n🎉 测试成功！收到了大模型的正常回复")
-                            break
-                        elif "错误" in content or "抱歉" in content:
-                            print(f"⚠️ 收到错误回复: {content}")
-                    else:
-                        print(f"📨 其他消息 ({msg_type}): {content}")
-                        
-                except asyncio.TimeoutError:
-                    print("⏰ 等待响应超时")
-                    break
-                except json.JSONDecodeError as e:
-                    print(f"❌ JSON解析错误: {e}")
-                    break
+            async def run_limited(index: int):
+                async with semaphore:
+                    await run_one_session(http, access_token, index)
             
-            print(f"\n📊 总共收到 {response_count} 个响应")
+            results = await asyncio.gather(
+                *(run_limited(i) for i in range(1, CHAT_SESSIONS + 1)),
+                return_exceptions=True
+            )
             
+            for index, result in enumerate(results, start=1):
+                if isinstance(result, Exception):
+                    print(f"❌ [会话{index}] 测试过程中出现错误: {result!r}")
+    
     except Exception as e:
         print(f"❌ 测试过程中出现错误: {e}")
         import traceback
@@ -124,4 +160,10 @@ async def test_frontend_chat():
     print("\n🔚 测试结束")
 
 if __name__ == "__main__":
-    asyncio.run(test_frontend_chat())
\ No newline at end of file
+    try:
+        import uvloop  # uvicorn[standard]在Linux/macOS上会安装uvloop，Windows下不可用
+        uvloop.install()
+    except ImportError:
+        pass
+    
+    asyncio.run(test_frontend_chat())